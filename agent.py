@@ -1,15 +1,35 @@
 import os
-from typing import List, Dict, Any, Optional
+import hashlib
+import sqlite3
+from typing import List, Dict, Any, Optional, AsyncIterator
 import pandas as pd
 from dataclasses import dataclass
-import json
+import orjson
 from concurrent.futures import ThreadPoolExecutor
 import asyncio
 from enum import Enum
 import aiohttp
 import logging
+import random
 from datetime import datetime
 
+# Retry settings for transient provider errors
+MAX_RETRIES = 5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_BACKOFF = 30  # Seconds
+
+CACHE_FILE = ".judgesense_cache.sqlite"
+
+SYSTEM_PROMPT = """As a legal analysis expert, analyze this case in Turkish and provide:
+1. Temel Hukuki İlkeler (Key Legal Principles)
+2. Ana Argümanlar (Main Arguments)
+3. Karar Gerekçesi (Decision Rationale)
+4. İlgili İçtihatlar (Relevant Precedents)
+5. Hukuk Öğrencileri için Öğrenme Noktaları (Learning Points for Law Students)
+
+Please structure your response using these headings and provide a concise analysis under each.
+Her bölüm için en fazla 120 kelime. Toplam 900 token'ı aşma."""
+
 
 class AgentType(Enum):
     CHATGPT = "chatgpt"
@@ -25,18 +45,82 @@ class AgentConfig:
     model: str
     temperature: float
     max_tokens: int
+    max_concurrency: int = 8  # Max in-flight requests to this provider
+
+
+class ResponseCache:
+    """Persistent cache of successful analyses, keyed per agent, model and prompt.
+
+    Case texts are normalized (whitespace collapsed, case folded) before
+    hashing so near-duplicate decisions that differ only in formatting
+    share a single LLM call.
+    """
+
+    def __init__(self, path: str = CACHE_FILE):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, analysis TEXT NOT NULL)")
+
+    @staticmethod
+    def make_key(agent_type: AgentType, model: str, system_prompt: str, case_text: str) -> str:
+        # The prompt is part of the key so editing it invalidates old analyses
+        normalized = " ".join(str(case_text).split()).casefold()
+        return hashlib.sha256(
+            f"{agent_type.value}|{model}|{system_prompt}|{normalized}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT analysis FROM responses WHERE key = ?", (key,)).fetchone()
+        return {"analysis": row[0]} if row else None
+
+    def set(self, key: str, result: Dict[str, Any]):
+        if "analysis" not in result:
+            return
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (key, analysis) VALUES (?, ?)", (key, result["analysis"]))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
 
 
 class LegalAgent:
-    def __init__(self, config: AgentConfig):
+    def __init__(self, config: AgentConfig, session: aiohttp.ClientSession,
+                 cache: Optional[ResponseCache] = None):
         self.config = config
-        self.session = aiohttp.ClientSession()
-
-    async def close(self):
-        await self.session.close()
+        self.session = session
+        self.cache = cache
+        self._prompt_prefix = SYSTEM_PROMPT + "\n\nCase to analyze:\n"
+        self._sem = asyncio.Semaphore(config.max_concurrency)
 
     async def analyze_case(self, case_text: str) -> Dict[str, Any]:
         """Analyze a legal case using the specific AI model"""
+        # Blank CSV cells come through pandas as NaN
+        if not isinstance(case_text, str) or not case_text.strip():
+            logging.warning(f"Skipping {self.config.agent_type} analysis of a case with no text")
+            return {"error": "Case has no text to analyze"}
+
+        if self.cache is None:
+            return await self._request_analysis(case_text)
+
+        try:
+            key = ResponseCache.make_key(
+                self.config.agent_type, self.config.model, SYSTEM_PROMPT, case_text)
+            cached = self.cache.get(key)
+        except Exception as e:
+            logging.error(f"Cache lookup failed for {self.config.agent_type}: {str(e)}")
+            return await self._request_analysis(case_text)
+        if cached is not None:
+            return cached
+
+        result = await self._request_analysis(case_text)
+        try:
+            self.cache.set(key, result)
+        except Exception as e:
+            logging.error(f"Cache write failed for {self.config.agent_type}: {str(e)}")
+        return result
+
+    async def _request_analysis(self, case_text: str) -> Dict[str, Any]:
         try:
             headers = self._get_headers()
             payload = self._prepare_payload(case_text)
@@ -46,21 +130,51 @@ class LegalAgent:
             if self.config.agent_type == AgentType.GOOGLE_AI:
                 url = f"{url}?key={self.config.api_key}"
 
-            async with self.session.post(url, json=payload, headers=headers) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    logging.error(
-                        f"API error for {self.config.agent_type}: Status {response.status}, Response: {error_text}")
-                    return {"error": f"API error: {response.status}"}
-
-                response_data = await response.json()
-                return self._parse_response(response_data)
+            # Cap in-flight requests so we stay within the provider's rate limits
+            async with self._sem:
+                for attempt in range(MAX_RETRIES):
+                    last_attempt = attempt == MAX_RETRIES - 1
+                    try:
+                        async with self.session.post(url, json=payload, headers=headers) as response:
+                            if response.status in RETRY_STATUSES and not last_attempt:
+                                wait_time = self._retry_delay(attempt, response)
+                            elif response.status != 200:
+                                # Only read a prefix; error bodies can be very large
+                                error_text = (await response.content.read(2048)).decode("utf-8", "replace")
+                                logging.error(
+                                    f"API error for {self.config.agent_type}: Status {response.status}, Response: {error_text}")
+                                return {"error": f"API error: {response.status}"}
+                            else:
+                                response_data = orjson.loads(await response.read())
+                                return self._parse_response(response_data)
+                    # A stalled response hits the session timeout; retry it like a dropped connection
+                    except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                        if last_attempt:
+                            raise
+                        wait_time = self._retry_delay(attempt)
+                        logging.warning(
+                            f"Connection error or timeout for {self.config.agent_type}: {e!r}")
+
+                    logging.warning(
+                        f"Retrying {self.config.agent_type} in {wait_time:.1f} seconds (attempt {attempt+1}/{MAX_RETRIES})")
+                    await asyncio.sleep(wait_time)
 
         except Exception as e:
             logging.error(
                 f"Error in {self.config.agent_type} analysis: {str(e)}")
             return {"error": str(e)}
 
+    def _retry_delay(self, attempt: int, response: Optional[aiohttp.ClientResponse] = None) -> float:
+        """Exponential backoff with jitter, honoring Retry-After when present"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            try:
+                # Capped so one huge Retry-After can't park a concurrency slot
+                return min(max(float(retry_after), 0), MAX_BACKOFF)
+            except (TypeError, ValueError):
+                pass
+        return min(2 ** attempt, MAX_BACKOFF) + random.uniform(0, 1)
+
     def _get_headers(self) -> Dict[str, str]:
         headers = {
             "Content-Type": "application/json"
@@ -76,13 +190,11 @@ class LegalAgent:
         return headers
 
     def _prepare_payload(self, case_text: str) -> Dict:
-        prompt = self._get_system_prompt() + "\n\nCase to analyze:\n" + case_text
-
         if self.config.agent_type == AgentType.CHATGPT:
             return {
                 "model": self.config.model,
                 "messages": [
-                    {"role": "system", "content": self._get_system_prompt()},
+                    {"role": "system", "content": SYSTEM_PROMPT},
                     {"role": "user", "content": case_text}
                 ],
                 "temperature": self.config.temperature,
@@ -92,7 +204,7 @@ class LegalAgent:
             return {
                 "contents": [{
                     "role": "user",
-                    "parts": [{"text": prompt}]
+                    "parts": [{"text": self._prompt_prefix + case_text}]
                 }],
                 "generation_config": {
                     "temperature": self.config.temperature,
@@ -104,21 +216,11 @@ class LegalAgent:
         else:  # DEEPSEEK
             return {
                 "model": self.config.model,
-                "prompt": prompt,
+                "prompt": self._prompt_prefix + case_text,
                 "temperature": self.config.temperature,
                 "max_tokens": self.config.max_tokens
             }
 
-    def _get_system_prompt(self) -> str:
-        return """As a legal analysis expert, analyze this case in Turkish and provide:
-1. Temel Hukuki İlkeler (Key Legal Principles)
-2. Ana Argümanlar (Main Arguments)
-3. Karar Gerekçesi (Decision Rationale)
-4. İlgili İçtihatlar (Relevant Precedents)
-5. Hukuk Öğrencileri için Öğrenme Noktaları (Learning Points for Law Students)
-
-Please structure your response using these headings and provide detailed analysis under each."""
-
     def _parse_response(self, response_data: Dict) -> Dict[str, Any]:
         try:
             if self.config.agent_type == AgentType.CHATGPT:
@@ -137,50 +239,129 @@ Please structure your response using these headings and provide detailed analysi
 
 
 class JurySaneSystem:
-    def __init__(self, agent_configs: List[AgentConfig], data_path: str):
-        self.agents = {config.agent_type: LegalAgent(
-            config) for config in agent_configs}
+    def __init__(self, agent_configs: List[AgentConfig], data_path: str, batch_concurrency: int = 16,
+                 cache_path: Optional[str] = CACHE_FILE):
+        self.agent_configs = agent_configs
+        self.cache = ResponseCache(cache_path) if cache_path else None
+        self.batch_concurrency = batch_concurrency
+        self._batch_sem: Optional[asyncio.Semaphore] = None
+        self.agents: Dict[AgentType, LegalAgent] = {}
+        self.session: Optional[aiohttp.ClientSession] = None
         self.data_path = data_path
         self.cases_df = pd.read_csv(data_path)
 
+        # Column-wise plain lists for cheap per-case lookups on the hot path
+        self._texts = self.cases_df["Explanation"].tolist()
+        self._courts = self.cases_df["Court Name"].tolist()
+        self._case_numbers = self.cases_df["Case Number"].tolist()
+        self._decision_dates = self.cases_df["Decision Date"].tolist()
+
+    async def _ensure_session(self):
+        """Create the shared HTTP session and agents on first use"""
+        if self.session is not None:
+            return
+
+        # One connector pool shared by all providers; explicit limits so
+        # concurrent requests reuse TCP/TLS connections instead of queueing
+        connector = aiohttp.TCPConnector(
+            limit=0,
+            limit_per_host=int(os.getenv("JS_POOL", 64)),
+            ttl_dns_cache=300,
+            keepalive_timeout=75,
+            enable_cleanup_closed=True
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=120, connect=10),
+            read_bufsize=4 * 1024 * 1024
+        )
+        self.agents = {config.agent_type: LegalAgent(config, self.session, self.cache)
+                       for config in self.agent_configs}
+        self._batch_sem = asyncio.Semaphore(self.batch_concurrency)
+
     async def analyze_case_multi_agent(self, case_idx: int) -> Dict[str, Any]:
         """Analyze a single case using all agents and combine their insights"""
-        case_text = self.cases_df.iloc[case_idx]["Explanation"]
-
-        # Get analysis from all agents concurrently
-        tasks = []
-        for agent_type, agent in self.agents.items():
-            tasks.append(asyncio.create_task(agent.analyze_case(case_text)))
-
-        results = await asyncio.gather(*tasks)
-
-        # Combine and compare analyses
-        combined_analysis = {
+        await self._ensure_session()
+        agent_analyses = await self._analyze_text(self._texts[case_idx])
+        return self._combine(case_idx, agent_analyses)
+
+    async def _analyze_text(self, case_text: str) -> Dict[str, Dict[str, Any]]:
+        """Get analysis from all agents concurrently, collecting each as it finishes"""
+        tasks = [asyncio.create_task(self._run_agent(agent_type, agent, case_text))
+                 for agent_type, agent in self.agents.items()]
+
+        results = {}
+        for next_result in asyncio.as_completed(tasks):
+            agent_type, result = await next_result
+            logging.info(
+                f"{agent_type.value} finished ({'ok' if 'analysis' in result else 'error'})")
+            results[agent_type] = result
+
+        # Keep the configured agent order in the output
+        return {agent_type.value: results[agent_type] for agent_type in self.agents}
+
+    @staticmethod
+    async def _run_agent(agent_type: AgentType, agent: LegalAgent, case_text: str):
+        return agent_type, await agent.analyze_case(case_text)
+
+    def _combine(self, case_idx: int, agent_analyses: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Attach case metadata to the agents' analyses"""
+        return {
             "case_metadata": {
-                "court": self.cases_df.iloc[case_idx]["Court Name"],
-                "case_number": self.cases_df.iloc[case_idx]["Case Number"],
-                "decision_date": self.cases_df.iloc[case_idx]["Decision Date"]
-            },
-            "agent_analyses": {
-                agent_type.value: result
-                for agent_type, result in zip(self.agents.keys(), results)
+                "case_index": case_idx,
+                "court": self._courts[case_idx],
+                "case_number": self._case_numbers[case_idx],
+                "decision_date": self._decision_dates[case_idx]
             },
+            "agent_analyses": agent_analyses,
             "analysis_timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
 
-        return combined_analysis
-
     async def analyze_batch(self, start_idx: int, batch_size: int) -> List[Dict[str, Any]]:
         """Analyze a batch of cases using all agents"""
+        await self._ensure_session()
+        return await asyncio.gather(*self._schedule_batch(start_idx, batch_size))
+
+    async def stream_batch(self, start_idx: int, batch_size: int) -> AsyncIterator[Dict[str, Any]]:
+        """Analyze a batch of cases, yielding each result as soon as it completes"""
+        await self._ensure_session()
+        tasks = self._schedule_batch(start_idx, batch_size)
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield await next_result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _schedule_batch(self, start_idx: int, batch_size: int) -> List[asyncio.Task]:
+        """Create one task per case; cases with identical text share one analysis"""
+        analyses: Dict[str, asyncio.Task] = {}
         tasks = []
-        for idx in range(start_idx, min(start_idx + batch_size, len(self.cases_df))):
-            tasks.append(self.analyze_case_multi_agent(idx))
-        return await asyncio.gather(*tasks)
+        for idx in range(start_idx, min(start_idx + batch_size, len(self._texts))):
+            case_text = self._texts[idx]
+            key = hashlib.sha256(str(case_text).encode("utf-8")).hexdigest()
+            if key not in analyses:
+                analyses[key] = asyncio.create_task(
+                    self._analyze_text_bounded(case_text))
+            tasks.append(asyncio.create_task(
+                self._combine_when_done(idx, analyses[key])))
+        return tasks
+
+    async def _analyze_text_bounded(self, case_text: str) -> Dict[str, Dict[str, Any]]:
+        """Analyze a case text while holding a slot of the batch-wide semaphore"""
+        async with self._batch_sem:
+            return await self._analyze_text(case_text)
+
+    async def _combine_when_done(self, case_idx: int, analysis: asyncio.Task) -> Dict[str, Any]:
+        return self._combine(case_idx, await analysis)
 
     async def close(self):
-        """Close all agent sessions"""
-        for agent in self.agents.values():
-            await agent.close()
+        """Close the shared HTTP session and the response cache"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        if self.cache is not None:
+            self.cache.close()
 
 
 async def main():
@@ -202,7 +383,8 @@ async def main():
             api_url="https://api.openai.com/v1/chat/completions",
             model="gpt-3.5-turbo",
             temperature=0.7,
-            max_tokens=2000
+            max_tokens=900,
+            max_concurrency=8
         ),
         AgentConfig(
             agent_type=AgentType.GOOGLE_AI,
@@ -210,7 +392,8 @@ async def main():
             api_url="https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent",
             model="gemini-pro",
             temperature=0.7,
-            max_tokens=2000
+            max_tokens=900,
+            max_concurrency=2
         ),
         AgentConfig(
             agent_type=AgentType.DEEPSEEK,
@@ -218,7 +401,8 @@ async def main():
             api_url="https://api.deepseek.com/v1/completions",
             model="deepseek-chat",
             temperature=0.7,
-            max_tokens=2000
+            max_tokens=900,
+            max_concurrency=4
         )
     ]
 
@@ -226,14 +410,14 @@ async def main():
     jurysane = JurySaneSystem(agent_configs, "legal_cases.csv")
 
     try:
-        # Analyze first 10 cases as a test
+        # Analyze first 10 cases as a test, writing one JSON line per
+        # finished case so partial results survive a crash
         logging.info("Starting batch analysis...")
-        results = await jurysane.analyze_batch(0, 10)
-
-        # Save results
-        output_file = f"multi_agent_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
+        output_file = f"multi_agent_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+        with open(output_file, "wb") as f:
+            async for result in jurysane.stream_batch(0, 10):
+                f.write(orjson.dumps(result) + b"\n")
+                f.flush()
 
         logging.info(f"Analysis complete. Results saved to {output_file}")
 
@@ -1,14 +1,19 @@
-import requests
-import time
+import asyncio
+import aiohttp
+import orjson
+import queue
+import random
+import re
+import threading
 import pandas as pd
 import os
 import signal
-from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from selectolax.lexbor import LexborHTMLParser
+from aiolimiter import AsyncLimiter
+from concurrent.futures import ProcessPoolExecutor
 import logging
-from contextlib import contextmanager
+from contextlib import asynccontextmanager
+from csv_store import CSV_FILE, read_last_page, open_csv_writer, csv_writer_loop
 
 # Configure logging
 logging.basicConfig(
@@ -22,9 +27,14 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Constants
-CSV_FILE = "legal_cases.csv"
-BATCH_SIZE = 5  # Number of pages to process before saving
 MAX_RETRIES = 5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BACKOFF_FACTOR = 0.5  # 0.5, 1, 2, 4... seconds between retries
+JITTER = 0.3  # Up to 30% extra random wait on each retry
+MAX_CONCURRENCY = 5  # Concurrent explanation fetches
+RATE_LIMIT = 5  # Max requests per second sent to the server
+REQUEST_TIMEOUT = 30  # Seconds per request, including the body
+WRITE_QUEUE_SIZE = 4  # Pages allowed to wait for the CSV writer thread
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
     "Accept": "application/json",
@@ -33,9 +43,17 @@ HEADERS = {
     "X-Requested-With": "XMLHttpRequest"
 }
 
+# Pre-rendered case list request; only the page number changes between calls.
+# Sent as raw bytes, relying on the JSON Content-Type in HEADERS.
+CASE_LIST_BODY = (b'{"data":{"aranan":"Hukuk","arananKelime":"Hukuk",'
+                  b'"pageSize":10,"pageNumber":%d}}')
+
 # Global flag for graceful termination
 terminate = False
 
+# Shared token bucket so concurrent fetches stay polite to the server
+rate_limiter = AsyncLimiter(RATE_LIMIT, 1)
+
 # Set up signal handler for graceful termination
 
 
@@ -49,47 +67,101 @@ def signal_handler(sig, frame):
 signal.signal(signal.SIGINT, signal_handler)
 
 
-@contextmanager
-def create_session():
-    """Create a robust session with retry logic and connection pooling"""
-    session = requests.Session()
-
-    # Configure retry strategy with exponential backoff
-    retry_strategy = Retry(
-        total=MAX_RETRIES,
-        backoff_factor=0.5,  # 0.5, 1, 2, 4... seconds between retries
-        status_forcelist=[429, 500, 502, 503, 504],
-        allowed_methods=["GET", "POST"]
+@asynccontextmanager
+async def create_session(cookies=None, user_agent=None):
+    """Create a shared aiohttp session with a bounded keep-alive connection pool.
+
+    ``cookies`` and ``user_agent`` let a browser-bootstrapped session (see
+    selenium_crawler.py) be handed over to the API client; challenge cookies
+    are often tied to the User-Agent that earned them.
+    """
+    headers = HEADERS if user_agent is None else {**HEADERS, "User-Agent": user_agent}
+    # Room for the explanation workers plus the prefetched case list, with
+    # idle connections kept open so requests skip the TLS handshake
+    connector = aiohttp.TCPConnector(
+        limit=MAX_CONCURRENCY * 2,
+        keepalive_timeout=75,
+        force_close=False,
+        enable_cleanup_closed=True
+    )
+    session = aiohttp.ClientSession(
+        connector=connector,
+        headers=headers,
+        cookies=cookies,
+        timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
     )
-
-    # Apply retry strategy to both HTTP and HTTPS connections
-    adapter = HTTPAdapter(max_retries=retry_strategy,
-                          pool_connections=10, pool_maxsize=10)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    session.headers.update(HEADERS)
 
     try:
         yield session
     finally:
-        session.close()
+        await session.close()
 
 
-def get_last_page():
-    """Determine the last successfully scraped page"""
-    if os.path.exists(CSV_FILE):
+def with_jitter(wait_time):
+    """Add random slack so concurrent workers don't all retry at the same moment"""
+    return wait_time + random.uniform(0, wait_time * JITTER)
+
+
+async def fetch_json(session, method, url, **kwargs):
+    """Send a rate-limited request and decode the JSON body.
+
+    Transient failures (429/5xx statuses, dropped connections, timeouts) are
+    retried here with backoff; anything else is raised to the caller.
+    """
+    for attempt in range(MAX_RETRIES):
+        last_attempt = attempt == MAX_RETRIES - 1
         try:
-            df = pd.read_csv(CSV_FILE)
-            if not df.empty:
-                return df["Page"].max()
-            return 0
-        except Exception as e:
-            logger.error(f"Error reading CSV file: {e}")
-            return 0
-    return 0
+            async with rate_limiter:
+                async with session.request(method, url, **kwargs) as response:
+                    if response.status in RETRY_STATUSES and not last_attempt:
+                        # Prefer the server's own hint over our backoff schedule
+                        retry_after = response.headers.get("Retry-After", "")
+                        if retry_after.isdigit():
+                            wait_time = with_jitter(float(retry_after))
+                        else:
+                            wait_time = with_jitter(
+                                BACKOFF_FACTOR * (2 ** attempt))
+                        reason = f"Status {response.status}"
+                    else:
+                        response.raise_for_status()
+                        return orjson.loads(await response.read())
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            if last_attempt:
+                raise
+            wait_time = with_jitter(BACKOFF_FACTOR * (2 ** attempt))
+            reason = f"Connection error ({e!r})"
+
+        logger.warning(
+            f"{reason} from {url}, retrying in {wait_time:.1f} seconds...")
+        await asyncio.sleep(wait_time)
+
+
+# Runs of whitespace other than newlines (incl. &nbsp;)
+SPACES_RE = re.compile(r"[^\S\n]+")
+
+
+def clean_html(raw_html):
+    """Convert a decision's HTML body to plain text with canonical whitespace"""
+    text = LexborHTMLParser(raw_html).text(separator="\n")
+    # Collapse space runs and drop blank lines; decisions are full of layout padding
+    lines = (SPACES_RE.sub(" ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def load_seen_cases():
+    """Collect the (case number, decision number) pairs already saved to the CSV"""
+    if not os.path.exists(CSV_FILE):
+        return set()
+    try:
+        df = pd.read_csv(CSV_FILE, usecols=[
+                         "Case Number", "Decision Number"], dtype=str)
+        return set(zip(df["Case Number"], df["Decision Number"]))
+    except Exception as e:
+        logger.error(f"Error reading saved case numbers: {e}")
+        return set()
 
 
-def initialize_search(session):
+async def initialize_search(session):
     """Initialize the search query"""
     search_payload = {
         "data": {
@@ -99,99 +171,94 @@ def initialize_search(session):
     }
     search_url = "https://emsal.uyap.gov.tr/arama"
     try:
-        response = session.post(search_url, json=search_payload)
-        response.raise_for_status()
+        async with rate_limiter:
+            async with session.post(search_url, json=search_payload) as response:
+                response.raise_for_status()
         return True
     except Exception as e:
         logger.error(f"Failed to initialize search: {e}")
         return False
 
 
-def get_case_list(session, page):
+async def get_case_list(session, page):
     """Get the list of cases for a specific page with CAPTCHA handling"""
-    case_list_payload = {
-        "data": {
-            "aranan": "Hukuk",
-            "arananKelime": "Hukuk",
-            "pageSize": 10,
-            "pageNumber": page
-        }
-    }
+    case_list_payload = CASE_LIST_BODY % page
     case_list_url = "https://emsal.uyap.gov.tr/aramalist"
 
+    # Transport errors are retried inside fetch_json; this loop only waits out CAPTCHAs
     for attempt in range(MAX_RETRIES):
         try:
-            response = session.post(case_list_url, json=case_list_payload)
-            response.raise_for_status()
-            case_data = response.json()
-
-            # Check for CAPTCHA
-            if case_data["metadata"]["FMC"] == "ADALET_RUNTIME_EXCEPTION":
-                wait_time = 10 + (attempt * 5)  # Increasing wait time
-                logger.warning(
-                    f"CAPTCHA detected on page {page}! Waiting {wait_time} seconds...")
-                time.sleep(wait_time)
-                continue
-
-            return case_data["data"]["data"]
-
-        except Exception as e:
-            wait_time = 5 + (attempt * 5)
-            logger.error(
-                f"Error fetching case list (attempt {attempt+1}/{MAX_RETRIES}): {e}")
-            if attempt < MAX_RETRIES - 1:
-                logger.info(f"Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
-            else:
-                logger.error(f"Max retries reached for page {page}")
-                return []
+            case_data = await fetch_json(session, "POST", case_list_url, data=case_list_payload)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.error(f"Error fetching case list for page {page}: {e}")
+            return []
 
+        # A malformed or null payload is a bad response, not a crash
+        try:
+            captcha = case_data["metadata"]["FMC"] == "ADALET_RUNTIME_EXCEPTION"
+            if not captcha:
+                return case_data["data"]["data"]
+        except (KeyError, TypeError) as e:
+            logger.error(f"Unexpected case list response for page {page}: {e!r}")
+            return []
+
+        # Check for CAPTCHA
+        wait_time = with_jitter(10 + (attempt * 5))  # Increasing wait time
+        logger.warning(
+            f"CAPTCHA detected on page {page}! Waiting {wait_time:.1f} seconds...")
+        await asyncio.sleep(wait_time)
+
+    logger.error(f"Max retries reached for page {page}")
     return []
 
 
-def get_explanation(session, case_id):
+async def get_explanation(session, case_id, html_pool=None):
     """Get the explanation for a specific case with CAPTCHA handling"""
     explanation_url = f"https://emsal.uyap.gov.tr/getDokuman?id={case_id}"
 
+    # Transport errors are retried inside fetch_json; this loop only waits out CAPTCHAs
     for attempt in range(MAX_RETRIES):
         try:
-            response = session.get(explanation_url)
-            response.raise_for_status()
-            explanation_json = response.json()
-
-            # Check for CAPTCHA
-            if explanation_json["metadata"]["FMC"] == "ADALET_RUNTIME_EXCEPTION":
-                wait_time = 10 + (attempt * 5)
-                logger.warning(
-                    f"CAPTCHA detected for case {case_id}! Waiting {wait_time} seconds...")
-                time.sleep(wait_time)
-                continue
-
-            raw_html = explanation_json.get("data", "")
-            soup = BeautifulSoup(raw_html, "html.parser")
-            return soup.get_text(separator="\n").strip()
-
-        except Exception as e:
-            wait_time = 5 + (attempt * 5)
-            logger.error(
-                f"Error fetching explanation for case {case_id} (attempt {attempt+1}/{MAX_RETRIES}): {e}")
-            if attempt < MAX_RETRIES - 1:
-                logger.info(f"Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
-            else:
-                logger.error(f"Max retries reached for case {case_id}")
-                return "Error fetching explanation"
+            explanation_json = await fetch_json(session, "GET", explanation_url)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.error(f"Error fetching explanation for case {case_id}: {e}")
+            return "Error fetching explanation"
 
+        # A malformed or null payload is a bad response, not a crash
+        try:
+            captcha = explanation_json["metadata"]["FMC"] == "ADALET_RUNTIME_EXCEPTION"
+            raw_html = explanation_json.get("data") or ""
+        except (KeyError, TypeError, AttributeError) as e:
+            logger.error(f"Unexpected explanation response for case {case_id}: {e!r}")
+            return "Error fetching explanation"
+
+        # Check for CAPTCHA
+        if captcha:
+            wait_time = with_jitter(10 + (attempt * 5))
+            logger.warning(
+                f"CAPTCHA detected for case {case_id}! Waiting {wait_time:.1f} seconds...")
+            await asyncio.sleep(wait_time)
+            continue
+
+        # Parse off the event loop so other fetches keep flowing
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(html_pool, clean_html, raw_html)
+
+    logger.error(f"Max retries reached for case {case_id}")
     return "Error fetching explanation"
 
 
-def process_case_batch(session, cases_list):
-    """Process a batch of cases using ThreadPoolExecutor"""
+async def process_case_batch(session, cases_list, semaphore, html_pool=None):
+    """Fetch explanations for a page of cases concurrently.
+
+    The semaphore is shared across pages so the in-flight limit holds even
+    while the previous page's slowest fetches are still running.
+    """
     case_data = []
 
-    # Define a worker function that includes the session
-    def fetch_explanation_worker(case):
-        explanation = get_explanation(session, case["id"])
+    async def fetch_explanation_worker(case):
+        async with semaphore:
+            explanation = await get_explanation(session, case["id"], html_pool)
         return {
             "Page": case["page"],
             "Court Name": case["daire"],
@@ -202,90 +269,105 @@ def process_case_batch(session, cases_list):
             "Explanation": explanation
         }
 
-    # Use ThreadPoolExecutor to fetch explanations in parallel
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        future_to_case = {executor.submit(
-            fetch_explanation_worker, case): case for case in cases_list}
-        for future in future_to_case:
-            try:
-                case_data.append(future.result())
-            except Exception as e:
-                logger.error(f"Error processing case: {e}")
+    results = await asyncio.gather(
+        *(fetch_explanation_worker(case) for case in cases_list), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Error processing case: {result}")
+        else:
+            case_data.append(result)
 
     return case_data
 
 
-def save_to_csv(data, mode="a"):
-    """Save data to CSV file with proper handling"""
-    try:
-        df = pd.DataFrame(data)
-        if df.empty:
-            logger.warning("No data to save")
-            return
-
-        header = not os.path.exists(CSV_FILE) or mode == "w"
-        df.to_csv(CSV_FILE, mode=mode, header=header,
-                  index=False, encoding="utf-8")
-        logger.info(f"Successfully saved {len(df)} cases to CSV")
-    except Exception as e:
-        logger.error(f"Error saving to CSV: {e}")
-        # Save to backup file as emergency measure
-        try:
-            df.to_csv(f"backup_{int(time.time())}.csv",
-                      index=False, encoding="utf-8")
-            logger.info("Data saved to backup file")
-        except Exception as backup_error:
-            logger.critical(f"Failed to save backup: {backup_error}")
-
-
-def main():
-    last_page = get_last_page()
+async def main(cookies=None, user_agent=None):
+    last_page = read_last_page()
     start_page = last_page + 1
     logger.info(f"Starting scraper from page {start_page}")
 
-    with create_session() as session:
-        # Initialize search
-        if not initialize_search(session):
-            logger.error("Failed to initialize search. Exiting.")
-            return
-
-        current_page = start_page
-        batch_data = []
-
-        while not terminate:
-            logger.info(f"Processing page {current_page}")
-
-            # Get cases for current page
-            cases_list = get_case_list(session, current_page)
+    seen_cases = load_seen_cases()
+    logger.info(f"{len(seen_cases)} cases already saved")
 
-            # Break if no more cases
-            if not cases_list:
-                logger.info("No more cases found. Scraping complete.")
-                break
-
-            # Add page number to each case for tracking
-            for case in cases_list:
-                case["page"] = current_page
-
-            # Process cases and add to batch
-            case_data = process_case_batch(session, cases_list)
-            batch_data.extend(case_data)
-
-            # Save data after batch is complete
-            if len(batch_data) >= BATCH_SIZE * 10 or terminate:  # 10 cases per page * BATCH_SIZE
-                logger.info(f"Saving batch of {len(batch_data)} cases...")
-                save_to_csv(batch_data)
-                batch_data = []  # Clear batch after saving
-
-            current_page += 1
+    try:
+        csv_file, writer = open_csv_writer()
+    except ValueError as e:
+        logger.error(str(e))
+        return
+    # No more parsers than concurrent fetches can ever feed
+    html_pool = ProcessPoolExecutor(
+        max_workers=min(MAX_CONCURRENCY, os.cpu_count() or 1))
+    # Disk writes (with fsync) run on their own thread so fetching never waits on them
+    write_queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+    writer_thread = threading.Thread(
+        target=csv_writer_loop, args=(write_queue, csv_file, writer), daemon=True)
+    writer_thread.start()
+    try:
+        async with create_session(cookies, user_agent) as session:
+            # Initialize search
+            if not await initialize_search(session):
+                logger.error("Failed to initialize search. Exiting.")
+                return
+
+            current_page = start_page
+            semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+            pending_page = None  # Explanation fetches of the previous page
+            list_task = asyncio.create_task(
+                get_case_list(session, current_page))
 
-        # Save any remaining data
-        if batch_data:
-            logger.info(f"Saving final batch of {len(batch_data)} cases...")
-            save_to_csv(batch_data)
+            try:
+                while not terminate:
+                    logger.info(f"Processing page {current_page}")
+
+                    # Get cases for current page
+                    cases_list = await list_task
+
+                    # Break if no more cases
+                    if not cases_list:
+                        logger.info("No more cases found. Scraping complete.")
+                        break
+
+                    # Prefetch the next page's list while this page's explanations download
+                    list_task = asyncio.create_task(
+                        get_case_list(session, current_page + 1))
+
+                    # Add page number to each case for tracking
+                    for case in cases_list:
+                        case["page"] = current_page
+
+                    # Skip cases saved by an earlier run or repeated from an earlier
+                    # page (the listing shifts as new decisions are published)
+                    cases_list = [case for case in cases_list
+                                  if (case["esasNo"], case["kararNo"]) not in seen_cases]
+                    seen_cases.update((case["esasNo"], case["kararNo"])
+                                      for case in cases_list)
+
+                    # Start this page's fetches, then finish the previous page while
+                    # they run so pages overlap but are still saved in order
+                    page_task = asyncio.create_task(
+                        process_case_batch(session, cases_list, semaphore, html_pool))
+                    # Queue each page for saving as soon as it completes so a crash
+                    # loses at most the pages still in flight
+                    if pending_page is not None:
+                        await asyncio.to_thread(write_queue.put, await pending_page)
+                    pending_page = page_task
+
+                    current_page += 1
+            finally:
+                # Drop an unused prefetch when stopping early
+                list_task.cancel()
+
+                # Save the last page still in flight, even if the loop raised
+                if pending_page is not None:
+                    await asyncio.to_thread(write_queue.put, await pending_page)
+    finally:
+        # Let the writer drain everything queued before closing the file
+        write_queue.put(None)
+        writer_thread.join()
+        html_pool.shutdown()
+        csv_file.close()
 
     logger.info("Scraper finished successfully")
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+import csv
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Output shared by every scraper, so they can all resume and append to one file
+CSV_FILE = "legal_cases.csv"
+LAST_PAGE_FILE = CSV_FILE + ".last_page"  # Sidecar holding the last saved page
+WRITE_BUFFER_SIZE = 1 << 20  # CSV file buffer, rows reach the OS in large writes
+FIELDNAMES = ["Page", "Court Name", "Case Number", "Decision Number",
+              "Decision Date", "Status", "Explanation"]
+
+# Decision texts can exceed the csv module's default 128 KiB field limit.
+# sys.maxsize overflows the C long behind this limit on Windows
+csv.field_size_limit(2**31 - 1)
+
+
+def write_last_page(page):
+    """Record the last page saved to the CSV so resuming needn't scan it"""
+    tmp_file = LAST_PAGE_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        f.write(str(page))
+    os.replace(tmp_file, LAST_PAGE_FILE)
+
+
+def read_last_page():
+    """Determine the last page saved to the CSV, trusting the sidecar only alongside it"""
+    # A sidecar left behind by a deleted or emptied CSV would skip every page up to it
+    if not os.path.exists(CSV_FILE) or os.path.getsize(CSV_FILE) == 0:
+        return 0
+
+    try:
+        with open(LAST_PAGE_FILE, encoding="utf-8") as f:
+            return int(f.read())
+    except FileNotFoundError:
+        pass
+    except ValueError as e:
+        logger.error(f"Invalid last page file, scanning CSV instead: {e}")
+
+    # No sidecar yet (e.g. a CSV from an older run), fall back to a full scan
+    try:
+        # Stream the rows so only one decision text is held at a time
+        with open(CSV_FILE, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            if not reader.fieldnames or "Page" not in reader.fieldnames:
+                return 0
+            return max((int(row["Page"]) for row in reader if row["Page"]),
+                       default=0)
+    except Exception as e:
+        logger.error(f"Error reading CSV file: {e}")
+        return 0
+
+
+def open_csv_writer():
+    """Open the CSV file for appending in the column order it already uses"""
+    fieldnames = FIELDNAMES
+    if os.path.exists(CSV_FILE) and os.path.getsize(CSV_FILE) > 0:
+        with open(CSV_FILE, newline="", encoding="utf-8") as f:
+            header = next(csv.reader(f), [])
+        if sorted(header) != sorted(FIELDNAMES):
+            raise ValueError(
+                f"{CSV_FILE} has unexpected columns {header}, refusing to append")
+        # Files from older browser runs put Page after Status; keep their order
+        fieldnames = header
+
+    # Large user-space buffer so rows reach the OS in a few big writes
+    csv_file = open(CSV_FILE, "a", newline="", encoding="utf-8",
+                    buffering=WRITE_BUFFER_SIZE)
+    writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+    if os.path.getsize(CSV_FILE) == 0:
+        writer.writeheader()
+    return csv_file, writer
+
+
+def save_to_csv(csv_file, writer, data):
+    """Append rows to the open CSV file durably, falling back to a backup file"""
+    if not data:
+        logger.warning("No data to save")
+        return
+
+    try:
+        writer.writerows(data)
+        csv_file.flush()
+        os.fsync(csv_file.fileno())
+        write_last_page(max(row["Page"] for row in data))
+        logger.info(f"Saved {len(data)} cases to CSV")
+    except Exception as e:
+        logger.error(f"Error saving to CSV: {e}")
+        # Emergency backup
+        try:
+            backup_file = f"backup_{int(time.time())}.csv"
+            with open(backup_file, "w", newline="", encoding="utf-8") as f:
+                backup_writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+                backup_writer.writeheader()
+                backup_writer.writerows(data)
+            logger.info(f"Data saved to backup: {backup_file}")
+        except Exception as backup_error:
+            logger.critical(f"Backup failed: {backup_error}")
+
+
+def csv_writer_loop(write_queue, csv_file, writer):
+    """Write queued pages to the CSV until a None sentinel arrives"""
+    while True:
+        data = write_queue.get()
+        if data is None:
+            break
+        save_to_csv(csv_file, writer, data)
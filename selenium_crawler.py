@@ -4,11 +4,12 @@ from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import time
-import pandas as pd
-import os
 import signal
 import logging
 import sys
+import asyncio
+import apitest_single
+import csv_store
 
 # Configure logging
 logging.basicConfig(
@@ -22,11 +23,16 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Constants
-CSV_FILE = "legal_cases.csv"
 BATCH_SIZE = 2  # Number of pages to process before saving
 MAX_RETRIES = 3
 PAGE_WAIT_TIME = 3  # Seconds to wait for page loads
 
+# Returns the text of every result row's cells as a list of lists
+ROW_CELLS_JS = """
+return Array.from(document.querySelectorAll('#detayAramaSonuclar tbody tr'))
+    .map(r => Array.from(r.querySelectorAll('td')).map(c => c.innerText.trim()));
+"""
+
 # Global flag for graceful termination
 terminate = False
 
@@ -37,40 +43,6 @@ def signal_handler(sig, frame):
 
 signal.signal(signal.SIGINT, signal_handler)
 
-def get_last_page():
-    """Determine the last successfully scraped page from CSV"""
-    if os.path.exists(CSV_FILE):
-        try:
-            df = pd.read_csv(CSV_FILE)
-            if not df.empty and 'Page' in df.columns:
-                return df["Page"].max()
-            return 0
-        except Exception as e:
-            logger.error(f"Error reading CSV file: {e}")
-            return 0
-    return 0
-
-def save_to_csv(data, mode="a"):
-    """Save data to CSV with backup mechanism"""
-    try:
-        df = pd.DataFrame(data)
-        if df.empty:
-            logger.warning("No data to save")
-            return
-
-        header = not os.path.exists(CSV_FILE) or mode == "w"
-        df.to_csv(CSV_FILE, mode=mode, header=header, index=False, encoding="utf-8")
-        logger.info(f"Saved {len(df)} cases to CSV")
-    except Exception as e:
-        logger.error(f"Error saving to CSV: {e}")
-        # Emergency backup
-        try:
-            backup_file = f"backup_{int(time.time())}.csv"
-            df.to_csv(backup_file, index=False, encoding="utf-8")
-            logger.info(f"Data saved to backup: {backup_file}")
-        except Exception as backup_error:
-            logger.critical(f"Backup failed: {backup_error}")
-
 def process_page(driver, wait, current_page):
     """Process all cases on a single page"""
     cases = []
@@ -78,24 +50,25 @@ def process_page(driver, wait, current_page):
         rows = WebDriverWait(driver, 30).until(
             EC.presence_of_all_elements_located((By.CSS_SELECTOR, "#detayAramaSonuclar tbody tr"))
         )
+        # Read every row's cells in one round-trip instead of one per cell
+        rows_data = driver.execute_script(ROW_CELLS_JS)
     except Exception as e:
         logger.error(f"Failed to find rows on page {current_page}: {e}")
         return []
 
-    for row in rows:
+    for row, columns in zip(rows, rows_data):
+        if len(columns) < 5:
+            continue
+
         retries = 0
         while retries < MAX_RETRIES and not terminate:
             try:
-                columns = row.find_elements(By.TAG_NAME, "td")
-                if len(columns) < 5:
-                    continue
-
                 case_info = {
-                    "Court Name": columns[0].text,
-                    "Case Number": columns[1].text,
-                    "Decision Number": columns[2].text,
-                    "Decision Date": columns[3].text,
-                    "Status": columns[4].text,
+                    "Court Name": columns[0],
+                    "Case Number": columns[1],
+                    "Decision Number": columns[2],
+                    "Decision Date": columns[3],
+                    "Status": columns[4],
                     "Page": current_page
                 }
 
@@ -118,17 +91,57 @@ def process_page(driver, wait, current_page):
 
     return cases
 
+def harvest_session(driver):
+    """Collect the browser's cookies and User-Agent so the API client can reuse its session"""
+    cookies = {c["name"]: c["value"] for c in driver.get_cookies()}
+    return cookies, driver.execute_script("return navigator.userAgent")
+
 def main():
+    """Pass the site's JS challenge in Chrome once, then scrape through the JSON API"""
+    options = webdriver.ChromeOptions()
+    driver = webdriver.Chrome(options=options)
+    wait = WebDriverWait(driver, 20)
+
+    try:
+        driver.get("https://emsal.uyap.gov.tr/#")
+
+        # Perform the search so the session cookies match an active query
+        search_box = wait.until(EC.presence_of_element_located((By.TAG_NAME, "input")))
+        search_box.send_keys("Hukuk" + Keys.RETURN)
+        wait.until(EC.presence_of_element_located(
+            (By.CSS_SELECTOR, "#detayAramaSonuclar tbody tr")))
+        cookies, user_agent = harvest_session(driver)
+    except Exception as e:
+        logger.error(f"Failed to bootstrap browser session: {e}")
+        return
+    finally:
+        driver.quit()
+
+    logger.info(f"Harvested {len(cookies)} cookies, switching to API scraper")
+    # The API scraper checks its own termination flag
+    signal.signal(signal.SIGINT, apitest_single.signal_handler)
+    asyncio.run(apitest_single.main(cookies, user_agent))
+
+def browser_main():
+    """Scrape entirely through the browser (fallback when the API is blocked)"""
+    # Shares the API scraper's writer so both append rows in the file's column order
+    try:
+        csv_file, writer = csv_store.open_csv_writer()
+    except ValueError as e:
+        logger.error(str(e))
+        return
+
     # Initialize browser
     options = webdriver.ChromeOptions()
     # options.add_argument("--headless")
     driver = webdriver.Chrome(options=options)
     wait = WebDriverWait(driver, 20)
 
-    last_page = get_last_page()
+    last_page = csv_store.read_last_page()
     current_page = last_page + 1
     logger.info(f"Resuming from page {current_page}")
 
+    batch_data = []
     try:
         # Navigate to initial URL
         driver.get("https://emsal.uyap.gov.tr/#")
@@ -138,7 +151,6 @@ def main():
         search_box.send_keys("Hukuk" + Keys.RETURN)
         time.sleep(PAGE_WAIT_TIME)
 
-        batch_data = []
         while not terminate:
             logger.info(f"Processing page {current_page}")
             
@@ -149,7 +161,7 @@ def main():
             # Save batch
             if len(batch_data) >= BATCH_SIZE * 10:  # 10 cases per page * BATCH_SIZE
                 logger.info(f"Saving batch of {len(batch_data)} cases")
-                save_to_csv(batch_data)
+                csv_store.save_to_csv(csv_file, writer, batch_data)
                 batch_data = []
 
             # Navigate to next page
@@ -172,10 +184,14 @@ def main():
         # Save remaining data
         if batch_data:
             logger.info(f"Saving final batch of {len(batch_data)} cases")
-            save_to_csv(batch_data)
+            csv_store.save_to_csv(csv_file, writer, batch_data)
         
         driver.quit()
+        csv_file.close()
         logger.info("Scraper terminated gracefully")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if "--browser" in sys.argv:
+        browser_main()
+    else:
+        main()
@@ -3,14 +3,18 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
+from dataclasses import dataclass
+import queue
+import random
+import threading
 import time
-import pandas as pd
 import os
 import signal
 import logging
 import sys
 import re
+from csv_store import FIELDNAMES, read_last_page, open_csv_writer, csv_writer_loop
 
 # Configure logging
 logging.basicConfig(
@@ -24,101 +28,255 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Constants
-CSV_FILE = "legal_cases.csv"
-BATCH_SIZE = 2  # Number of pages to process before saving
+# Chrome profile kept between runs so cookies from a solved CAPTCHA survive restarts
+CHROME_PROFILE_DIR = "chrome_profile"
 MAX_RETRIES = 3
-PAGE_WAIT_TIME = 3  # Seconds to wait for page loads
+BACKOFF_FACTOR = 0.2  # First retry waits ~0.4s, doubling each attempt
+MAX_BACKOFF = 2  # Cap on the wait between retries of a row
+PAGE_LOAD_TIMEOUT = 15  # Max seconds to wait for a page or table redraw
 # Seconds to wait for user to solve CAPTCHA (3 minutes)
 CAPTCHA_WAIT_TIME = 180
-
-# Global flag for graceful termination
-terminate = False
+CAPTCHA_POLL_START = 0.5  # First delay between CAPTCHA checks, grows 1.5x per check
+CAPTCHA_POLL_MAX = 5  # Longest delay between CAPTCHA checks
+EXPLANATION_WAIT_TIME = 20  # Seconds to wait for a decision text to open
+EXPLANATION_SETTLE_MS = 100  # Pane must stop changing this long before it is read
+MAX_DRIVER_RESTARTS = 3  # Times a crashed Chrome is replaced before giving up
+WRITE_QUEUE_SIZE = 4  # Pages allowed to wait for the CSV writer thread
+
+# Locators for the search page and the DataTables results grid
+SEARCH_BOX = (By.TAG_NAME, "input")
+RESULTS_TABLE = (By.CSS_SELECTOR, "#detayAramaSonuclar")
+RESULT_ROWS = (By.CSS_SELECTOR, "#detayAramaSonuclar tbody tr")
+PROCESSING_OVERLAY = (By.CSS_SELECTOR, ".dataTables_processing")
+FIRST_PAGE_BUTTON = (By.CSS_SELECTOR, ".paginate_button.first")
+
+# Returns a result row's cell texts in one WebDriver call instead of one per cell
+ROW_CELLS_JS = "return Array.from(arguments[0].cells, c => c.innerText.trim());"
+# Same for every result row on the page at once
+PAGE_CELLS_JS = """
+return Array.from(document.querySelectorAll('#detayAramaSonuclar tbody tr'),
+    r => Array.from(r.cells, c => c.innerText.trim()));
+"""
+
+# Web fonts are never read by the scraper; images and CSS still load so a
+# CAPTCHA stays solvable by hand
+BLOCKED_URLS = ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"]
+
+# Text hints of a CAPTCHA page, matched against the page source as a last resort
+CAPTCHA_KEYWORDS_RE = re.compile(
+    r"captcha|robot|human verification|güvenlik doğrulaması|doğrulama", re.IGNORECASE)
+
+# Clicks Next in the same call that checks it; returns null when the button
+# is missing and false when it is disabled (last page)
+NEXT_PAGE_JS = """
+const button = document.getElementById('detayAramaSonuclar_next');
+if (!button) return null;
+if (button.classList.contains('disabled')) return false;
+button.click();
+return true;
+"""
+
+# Draws a results page directly through the DataTables API; returns false
+# when the table is not a DataTable so the caller can click through instead
+JUMP_TO_PAGE_JS = """
+const $ = window.jQuery;
+if (!$ || !$.fn.dataTable || !$.fn.dataTable.isDataTable('#detayAramaSonuclar'))
+    return false;
+$('#detayAramaSonuclar').DataTable().page(arguments[0]).draw('page');
+return true;
+"""
+DATATABLE_PAGE_JS = "return jQuery('#detayAramaSonuclar').DataTable().page() + 1;"
+TOTAL_PAGES_JS = "return jQuery('#detayAramaSonuclar').DataTable().page.info().pages;"
+
+# Text of the decision pane, or '' while it is hidden
+PANE_TEXT_JS = """
+const pane = document.getElementById('kararAlani');
+return pane && pane.offsetParent !== null ? pane.innerText.trim() : '';
+"""
+
+# Empties the decision pane before a row is clicked, so any text that shows up
+# afterwards belongs to that row even when it matches the previous decision
+CLEAR_PANE_JS = """
+const pane = document.getElementById('kararAlani');
+if (pane) pane.textContent = '';
+"""
+
+# Any of these on the page means a CAPTCHA is being shown
+CAPTCHA_SELECTORS = ", ".join([
+    "iframe[src*='recaptcha']",
+    "iframe[src*='captcha']",
+    ".g-recaptcha",
+    "#recaptcha",
+    ".captcha-container",
+    "form[action*='captcha']",
+    "img[src*='captcha']"
+])
+
+# Runs the table, CAPTCHA element and URL checks in one WebDriver call and
+# returns the reason a CAPTCHA is suspected, false when result rows are shown
+# (no CAPTCHA), or null when only the page text can tell
+CAPTCHA_CHECK_JS = """
+if (!document.querySelector('#detayAramaSonuclar'))
+    return 'Results table not found - possible CAPTCHA or redirect';
+if (document.querySelector(arguments[0]))
+    return 'CAPTCHA element detected';
+const url = location.href;
+if (url.includes('login') || url.includes('captcha') || !url.includes('emsal'))
+    return 'Redirected to non-results URL: ' + url;
+if (document.querySelector('#detayAramaSonuclar tbody tr'))
+    return false;
+return null;
+"""
+
+# Opens every result row in turn and resolves with [cells, explanation] pairs,
+# so a whole page costs one WebDriver call instead of several per row.
+# The pane is emptied before each click and read once new text has appeared and
+# stopped mutating for the settle time; an explanation is null when that did
+# not happen in time.
+EXPLANATION_BATCH_JS = """
+const timeout = arguments[0];
+const settleTime = arguments[1];
+const done = arguments[arguments.length - 1];
+const readPane = () => {
+    const pane = document.getElementById('kararAlani');
+    return pane && pane.offsetParent !== null ? pane.innerText.trim() : '';
+};
+const openRow = row => new Promise(resolve => {
+    let settle = null;
+    const finish = text => {
+        observer.disconnect();
+        clearTimeout(timer);
+        clearTimeout(settle);
+        resolve(text);
+    };
+    const check = () => {
+        clearTimeout(settle);
+        if (readPane()) {
+            settle = setTimeout(() => finish(readPane() || null), settleTime);
+        }
+    };
+    const observer = new MutationObserver(check);
+    const timer = setTimeout(() => finish(null), timeout);
+    const pane = document.getElementById('kararAlani');
+    if (pane) pane.textContent = '';
+    observer.observe(document.body,
+        {childList: true, subtree: true, characterData: true, attributes: true});
+    row.click();
+    check();
+});
+(async () => {
+    const results = [];
+    for (const row of document.querySelectorAll('#detayAramaSonuclar tbody tr')) {
+        const cells = Array.from(row.cells, c => c.innerText.trim());
+        // Placeholder rows (e.g. "no results") have no decision to open
+        if (cells.length < 5) {
+            results.push([cells, null]);
+            continue;
+        }
+        results.push([cells, await openRow(row)]);
+    }
+    done(results);
+})().catch(() => done(null));
+"""
+
+# Set by the SIGINT/SIGTERM handlers to stop after the current page
+terminate = threading.Event()
+
+
+@dataclass(slots=True)
+class Case:
+    """A scraped decision, with fields in FIELDNAMES order"""
+    page: int
+    court_name: str
+    case_number: str
+    decision_number: str
+    decision_date: str
+    status: str
+    explanation: str = ""
+
+    @classmethod
+    def from_cells(cls, page, cells, explanation=""):
+        return cls(page, *cells[:5], explanation)
+
+    def as_row(self):
+        return (self.page, self.court_name, self.case_number, self.decision_number,
+                self.decision_date, self.status, self.explanation)
+
+    def as_dict(self):
+        return dict(zip(FIELDNAMES, self.as_row()))
 
 
 def signal_handler(sig, frame):
-    global terminate
-    logger.info("Received termination signal. Will exit after current batch...")
-    terminate = True
+    logger.info("Received termination signal. Will exit after current page...")
+    terminate.set()
 
 
 signal.signal(signal.SIGINT, signal_handler)
+# A plain kill would otherwise skip the finally block that drains the CSV writer
+signal.signal(signal.SIGTERM, signal_handler)
 
 
-def get_last_page():
-    """Determine the last successfully scraped page from CSV"""
-    if os.path.exists(CSV_FILE):
-        try:
-            df = pd.read_csv(CSV_FILE)
-            if not df.empty and 'Page' in df.columns:
-                return df["Page"].max()
-            return 0
-        except Exception as e:
-            logger.error(f"Error reading CSV file: {e}")
-            return 0
-    return 0
+def wait_for_element(driver, locator, timeout=PAGE_LOAD_TIMEOUT):
+    """Wait until an element is present, leaving timeouts to the caller's checks"""
+    try:
+        WebDriverWait(driver, timeout).until(
+            EC.presence_of_element_located(locator))
+        return True
+    except TimeoutException:
+        logger.warning(f"Timed out waiting for {locator[1]}")
+        return False
 
 
-def save_to_csv(data, mode="a"):
-    """Save data to CSV with backup mechanism"""
-    try:
-        df = pd.DataFrame(data)
-        if df.empty:
-            logger.warning("No data to save")
-            return
-
-        header = not os.path.exists(CSV_FILE) or mode == "w"
-        df.to_csv(CSV_FILE, mode=mode, header=header,
-                  index=False, encoding="utf-8")
-        logger.info(f"Saved {len(df)} cases to CSV")
-    except Exception as e:
-        logger.error(f"Error saving to CSV: {e}")
-        # Emergency backup
+def wait_for_results_redraw(driver, old_rows):
+    """Wait until the previous result rows are replaced by new ones"""
+    if old_rows:
         try:
-            backup_file = f"backup_{int(time.time())}.csv"
-            df.to_csv(backup_file, index=False, encoding="utf-8")
-            logger.info(f"Data saved to backup: {backup_file}")
-        except Exception as backup_error:
-            logger.critical(f"Backup failed: {backup_error}")
+            WebDriverWait(driver, PAGE_LOAD_TIMEOUT).until(
+                EC.staleness_of(old_rows[0]))
+        except TimeoutException:
+            logger.warning("Results table did not redraw after click")
+            return False
+    # DataTables shows its processing overlay until the new rows are in
+    try:
+        WebDriverWait(driver, PAGE_LOAD_TIMEOUT).until(
+            EC.invisibility_of_element_located(PROCESSING_OVERLAY))
+    except TimeoutException:
+        logger.warning("Results table still processing after click")
+        return False
+    return wait_for_element(driver, RESULT_ROWS)
+
+
+def click_and_wait_for_results(driver, button):
+    """Click a pagination button and wait until the results table redraws"""
+    old_rows = driver.find_elements(*RESULT_ROWS)
+    button.click()
+    return wait_for_results_redraw(driver, old_rows)
+
+
+def click_next_page(driver):
+    """Go to the next results page, returning False on the last page"""
+    old_rows = driver.find_elements(*RESULT_ROWS)
+    clicked = driver.execute_script(NEXT_PAGE_JS)
+    if clicked is None:
+        raise NoSuchElementException("Next button not found")
+    if clicked:
+        wait_for_results_redraw(driver, old_rows)
+    return clicked
 
 
 def check_for_captcha(driver):
     """Improved CAPTCHA detection"""
     try:
-        # Check if we're no longer on the expected results page
-        results_table = driver.find_elements(
-            By.CSS_SELECTOR, "#detayAramaSonuclar")
-        if len(results_table) == 0:
-            logger.info(
-                "Results table not found - possible CAPTCHA or redirect")
-            return True
-
-        # Check for common CAPTCHA elements
-        captcha_elements = [
-            "iframe[src*='recaptcha']",
-            "iframe[src*='captcha']",
-            ".g-recaptcha",
-            "#recaptcha",
-            ".captcha-container",
-            "form[action*='captcha']",
-            "img[src*='captcha']"
-        ]
-
-        for selector in captcha_elements:
-            if len(driver.find_elements(By.CSS_SELECTOR, selector)) > 0:
-                logger.info(f"CAPTCHA element detected: {selector}")
-                return True
-
-        # Check for redirection to login/captcha page
-        current_url = driver.current_url
-        if "login" in current_url or "captcha" in current_url or "emsal" not in current_url:
-            logger.info(f"Redirected to non-results URL: {current_url}")
+        reason = driver.execute_script(CAPTCHA_CHECK_JS, CAPTCHA_SELECTORS)
+        if reason:
+            logger.info(reason)
             return True
+        if reason is False:
+            # Results are showing; skip serializing the whole page
+            return False
 
         # Check page source for CAPTCHA-related keywords
-        page_source = driver.page_source.lower()
-        captcha_keywords = [
-            "captcha", "robot", "human verification", "güvenlik doğrulaması", "doğrulama"]
-        if any(keyword in page_source for keyword in captcha_keywords):
+        if CAPTCHA_KEYWORDS_RE.search(driver.page_source):
             logger.info("CAPTCHA-related text found in page source")
             return True
 
@@ -128,6 +286,12 @@ def check_for_captcha(driver):
         return True  # Assume there's a CAPTCHA if we can't check properly
 
 
+def get_displayed_page(driver):
+    """Read the results page DataTables is showing, counting from 1"""
+    # The info text is localised, so ask DataTables rather than parsing it
+    return int(driver.execute_script(DATATABLE_PAGE_JS))
+
+
 def wait_for_captcha_solution(driver, current_page):
     """Wait for the user to solve the CAPTCHA and return to results page"""
     logger.info(
@@ -138,11 +302,12 @@ def wait_for_captcha_solution(driver, current_page):
     driver.maximize_window()
 
     start_time = time.time()
+    # Poll quickly at first so a fast solve is noticed within a second
+    poll_delay = CAPTCHA_POLL_START
     while time.time() - start_time < CAPTCHA_WAIT_TIME:
         try:
             # Check if we're back on the results page
-            results_table = driver.find_elements(
-                By.CSS_SELECTOR, "#detayAramaSonuclar")
+            results_table = driver.find_elements(*RESULTS_TABLE)
             if len(results_table) > 0:
                 logger.info(
                     "Results page detected. CAPTCHA appears to be solved!")
@@ -150,15 +315,7 @@ def wait_for_captcha_solution(driver, current_page):
                 # Check if we need to navigate back to the correct page
                 # First, determine what page we're currently on
                 try:
-                    pagination_info = driver.find_element(
-                        By.CSS_SELECTOR, ".pagination-info, .dataTables_info").text
-                    # Extract current page using regex if available
-                    page_match = re.search(
-                        r"page\s+(\d+)", pagination_info.lower())
-                    current_displayed_page = 1  # Default to page 1
-
-                    if page_match:
-                        current_displayed_page = int(page_match.group(1))
+                    current_displayed_page = get_displayed_page(driver)
 
                     logger.info(
                         f"Current displayed page after CAPTCHA: {current_displayed_page}")
@@ -174,28 +331,49 @@ def wait_for_captcha_solution(driver, current_page):
                 return (True, None)  # CAPTCHA solved, no page info
 
             # Wait a bit before checking again
-            time.sleep(5)
+            time.sleep(poll_delay)
         except Exception as e:
             logger.warning(f"Error while waiting for CAPTCHA solution: {e}")
-            time.sleep(5)
+            time.sleep(poll_delay)
+        poll_delay = min(poll_delay * 1.5, CAPTCHA_POLL_MAX)
 
     logger.error("CAPTCHA wait time exceeded. Terminating script.")
     return (False, None)
 
 
+def jump_to_page(driver, target_page):
+    """Jump straight to a results page, returning False if it didn't land there"""
+    old_rows = driver.find_elements(*RESULT_ROWS)
+    try:
+        if not driver.execute_script(JUMP_TO_PAGE_JS, target_page - 1):
+            return False
+        wait_for_results_redraw(driver, old_rows)
+        return driver.execute_script(DATATABLE_PAGE_JS) == target_page
+    except Exception as e:
+        logger.warning(f"Could not jump to page {target_page}: {e}")
+        return False
+
+
+def get_total_pages(driver):
+    """Read the number of result pages from DataTables, or None if unavailable"""
+    try:
+        return int(driver.execute_script(TOTAL_PAGES_JS))
+    except Exception as e:
+        logger.warning(f"Could not read total page count: {e}")
+        return None
+
+
 def navigate_to_page(driver, target_page):
     """Navigate to a specific page number"""
     logger.info(f"Attempting to navigate to page {target_page}")
 
     try:
         # First, check what page we're currently on
-        current_pagination = driver.find_element(
-            By.CSS_SELECTOR, ".dataTables_info").text
-        current_page_match = re.search(
-            r"page\s+(\d+)", current_pagination.lower())
-        current_page = 1
-        if current_page_match:
-            current_page = int(current_page_match.group(1))
+        try:
+            current_page = get_displayed_page(driver)
+        except Exception as e:
+            logger.warning(f"Could not read current page, assuming page 1: {e}")
+            current_page = 1
 
         logger.info(
             f"Currently on page {current_page}, need to navigate to page {target_page}")
@@ -204,26 +382,31 @@ def navigate_to_page(driver, target_page):
             logger.info("Already on the correct page")
             return True
 
+        # One redraw instead of clicking Next once per page
+        if jump_to_page(driver, target_page):
+            logger.info(f"Jumped to page {target_page}")
+            if check_for_captcha(driver):
+                logger.warning("CAPTCHA detected after jumping to page")
+                captcha_result, _ = wait_for_captcha_solution(
+                    driver, target_page)
+                return captcha_result
+            return True
+
         # If we need to go backward, we might need to go to the first page first
         if target_page < current_page:
             logger.info("Need to go backward, returning to first page")
-            first_page_button = driver.find_element(
-                By.CSS_SELECTOR, ".paginate_button.first")
+            first_page_button = driver.find_element(*FIRST_PAGE_BUTTON)
             if first_page_button and "disabled" not in first_page_button.get_attribute("class"):
-                first_page_button.click()
-                time.sleep(PAGE_WAIT_TIME)
+                click_and_wait_for_results(driver, first_page_button)
                 current_page = 1
 
         # Now navigate forward to the target page
         while current_page < target_page:
-            next_button = driver.find_element(By.ID, "detayAramaSonuclar_next")
-            if "disabled" in next_button.get_attribute("class"):
+            if not click_next_page(driver):
                 logger.warning(
                     f"Cannot navigate to page {target_page}, reached the end at page {current_page}")
                 return False
 
-            next_button.click()
-            time.sleep(PAGE_WAIT_TIME)
             current_page += 1
             logger.info(f"Navigated to page {current_page}")
 
@@ -241,9 +424,46 @@ def navigate_to_page(driver, target_page):
         return False
 
 
+def fetch_page_explanations(driver, row_count):
+    """Open every row of the current page in one script call"""
+    driver.set_script_timeout(row_count * EXPLANATION_WAIT_TIME + 10)
+    try:
+        results = driver.execute_async_script(
+            EXPLANATION_BATCH_JS, EXPLANATION_WAIT_TIME * 1000, EXPLANATION_SETTLE_MS)
+        if results:
+            return results
+    except Exception as e:
+        logger.warning(f"Batch explanation fetch failed: {e}")
+
+    # Still read all the cells in one call so only the clicks remain per row
+    try:
+        return [(cells, None) for cells in driver.execute_script(PAGE_CELLS_JS)]
+    except Exception as e:
+        logger.warning(f"Failed to read result rows: {e}")
+        return []
+
+
+def wait_for_new_explanation(driver):
+    """Wait until the cleared decision pane shows text that has stopped changing"""
+    last_seen = None
+
+    def settled(d):
+        nonlocal last_seen
+        text = d.execute_script(PANE_TEXT_JS)
+        if not text:
+            last_seen = None
+            return False
+        # Require the same text on two polls so a half-rendered pane isn't read
+        if text == last_seen:
+            return text
+        last_seen = text
+        return False
+
+    return WebDriverWait(driver, EXPLANATION_WAIT_TIME).until(settled)
+
+
 def process_page(driver, wait, current_page):
     """Process all cases on a single page"""
-    global terminate
     cases = []
 
     # First check if we need to handle CAPTCHA
@@ -266,7 +486,7 @@ def process_page(driver, wait, current_page):
         # Wait for rows to be present
         rows = WebDriverWait(driver, 30).until(
             EC.presence_of_all_elements_located(
-                (By.CSS_SELECTOR, "#detayAramaSonuclar tbody tr"))
+                RESULT_ROWS)
         )
 
         if not rows:
@@ -292,50 +512,60 @@ def process_page(driver, wait, current_page):
 
         return [], current_page
 
+    # Try the whole page in one round-trip; rows it could not open are
+    # retried below one click at a time
+    prefetched = fetch_page_explanations(driver, len(rows))
+
     for row_idx, row in enumerate(rows):
-        if terminate:
+        if terminate.is_set():
             break
 
+        if row_idx < len(prefetched):
+            columns, explanation = prefetched[row_idx]
+            if len(columns) < 5:
+                logger.warning(
+                    f"Row {row_idx+1} has insufficient columns: {len(columns)}")
+                continue
+            if explanation and len(explanation) >= 10:
+                cases.append(Case.from_cells(current_page, columns, explanation))
+                continue
+
         retries = 0
-        while retries < MAX_RETRIES and not terminate:
+        while retries < MAX_RETRIES and not terminate.is_set():
             try:
-                columns = row.find_elements(By.TAG_NAME, "td")
+                if row_idx < len(prefetched):
+                    columns = prefetched[row_idx][0]
+                else:
+                    columns = driver.execute_script(ROW_CELLS_JS, row)
                 if len(columns) < 5:
                     logger.warning(
                         f"Row {row_idx+1} has insufficient columns: {len(columns)}")
                     break
 
-                case_info = {
-                    "Court Name": columns[0].text.strip(),
-                    "Case Number": columns[1].text.strip(),
-                    "Decision Number": columns[2].text.strip(),
-                    "Decision Date": columns[3].text.strip(),
-                    "Status": columns[4].text.strip(),
-                    "Page": current_page
-                }
+                case_info = Case.from_cells(current_page, columns)
 
                 # Check if we already have valid data to avoid redundant clicks
-                if all(len(val) > 0 for key, val in case_info.items() if key != "Page"):
+                if all(columns[:5]):
                     logger.info(
-                        f"Processing case {case_info['Case Number']} from page {current_page}")
+                        f"Processing case {case_info.case_number} from page {current_page}")
                 else:
                     logger.warning(
                         f"Case on row {row_idx+1} has empty fields: {case_info}")
 
+                # Empty the pane so the wait can't mistake the previous case for this one
+                driver.execute_script(CLEAR_PANE_JS)
+
                 # Click to get explanation
                 driver.execute_script("arguments[0].click();", row)
 
                 # Wait for explanation to appear
                 try:
-                    explanation_element = WebDriverWait(driver, 20).until(
-                        EC.visibility_of_element_located((By.ID, "kararAlani"))
-                    )
-                    explanation = explanation_element.text.strip()
+                    explanation = wait_for_new_explanation(driver)
 
                     # Check if explanation is empty or very short (likely an error)
                     if not explanation or len(explanation) < 10:
                         logger.warning(
-                            f"Empty or very short explanation detected for case {case_info['Case Number']}")
+                            f"Empty or very short explanation detected for case {case_info.case_number}")
 
                         # One empty case is enough to trigger CAPTCHA check
                         if check_for_captcha(driver):
@@ -354,14 +584,14 @@ def process_page(driver, wait, current_page):
                         retries += 1
                         continue
 
-                    case_info["Explanation"] = explanation
+                    case_info.explanation = explanation
                     logger.info(
-                        f"Successfully retrieved explanation for case {case_info['Case Number']}")
+                        f"Successfully retrieved explanation for case {case_info.case_number}")
 
                 except TimeoutException:
                     # If we can't find the explanation area, check for CAPTCHA
                     logger.warning(
-                        f"No explanation area found for case {case_info['Case Number']}. Checking for CAPTCHA...")
+                        f"No explanation area found for case {case_info.case_number}. Checking for CAPTCHA...")
                     if check_for_captcha(driver):
                         captcha_solved, new_page = wait_for_captcha_solution(
                             driver, current_page)
@@ -384,10 +614,14 @@ def process_page(driver, wait, current_page):
                 logger.warning(
                     f"Retry {retries+1}/{MAX_RETRIES} for case on row {row_idx+1}: {e}")
                 retries += 1
-                time.sleep(2)
-                if retries >= MAX_RETRIES:
-                    logger.error(
-                        f"Failed to process case on row {row_idx+1} after {MAX_RETRIES} attempts")
+                # Short capped backoff; jitter avoids a fixed click rhythm
+                delay = min(MAX_BACKOFF, BACKOFF_FACTOR * 2 ** retries)
+                time.sleep(delay * random.uniform(0.8, 1.2))
+
+        # Covers timeouts and short texts as well as errors, so no row is dropped silently
+        if retries >= MAX_RETRIES:
+            logger.error(
+                f"Giving up on case on row {row_idx+1} of page {current_page} after {MAX_RETRIES} attempts")
 
     # If we didn't get any valid cases with explanations, this is likely a CAPTCHA issue
     if not cases:
@@ -415,7 +649,7 @@ def reset_search(driver, wait, current_page):
 
         # Navigate to the main page
         driver.get("https://emsal.uyap.gov.tr/#")
-        time.sleep(PAGE_WAIT_TIME * 2)  # Extra wait time for initial load
+        wait_for_element(driver, SEARCH_BOX)
 
         # Check for CAPTCHA
         if check_for_captcha(driver):
@@ -427,16 +661,16 @@ def reset_search(driver, wait, current_page):
         # Perform search
         try:
             search_box = wait.until(
-                EC.presence_of_element_located((By.TAG_NAME, "input")))
+                EC.presence_of_element_located(SEARCH_BOX))
             search_box.clear()
             search_box.send_keys("Hukuk" + Keys.RETURN)
-            time.sleep(PAGE_WAIT_TIME * 2)  # Wait longer for search results
+            wait_for_element(driver, RESULT_ROWS)
         except Exception as e:
             logger.error(f"Failed to perform search: {e}")
             return False
 
         # Check if search was successful
-        if len(driver.find_elements(By.CSS_SELECTOR, "#detayAramaSonuclar")) == 0:
+        if len(driver.find_elements(*RESULTS_TABLE)) == 0:
             logger.error("Search did not return results table")
             return False
 
@@ -451,12 +685,16 @@ def reset_search(driver, wait, current_page):
         return False
 
 
-def main():
-    global terminate
-
+def build_driver():
+    """Start Chrome with the anti-detection and download-trimming options"""
     # Initialize browser with more undetectable options
     options = webdriver.ChromeOptions()
     # Never use headless mode with CAPTCHAs
+    # Hand control back at DOMContentLoaded; the waits below cover the rest
+    options.page_load_strategy = "eager"
+    options.add_argument("--disable-extensions")
+    options.add_argument(
+        f"--user-data-dir={os.path.abspath(CHROME_PROFILE_DIR)}")
 
     # Add options that might help bypass CAPTCHA detection
     options.add_argument("--disable-blink-features=AutomationControlled")
@@ -471,6 +709,10 @@ def main():
     # Set normal window size to appear more like a human user
     driver.set_window_size(1366, 768)
 
+    # Skip downloading resources the scraper never uses
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+
     # Execute CDP commands to modify navigator.webdriver property
     driver.execute_script(
         "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
@@ -478,50 +720,55 @@ def main():
     # Add cookies to simulate a returning user
     driver.execute_script("document.cookie = 'visited=true; path=/';")
 
-    wait = WebDriverWait(driver, 20)
+    return driver
 
-    last_page = get_last_page()
-    current_page = last_page + 1 if last_page > 0 else 1
-    logger.info(f"Starting from page {current_page}")
 
+def start_search(driver, wait, current_page):
+    """Open the site, run the search and go to current_page"""
+    # Navigate to initial URL
+    driver.get("https://emsal.uyap.gov.tr/#")
+    wait_for_element(driver, SEARCH_BOX)
+
+    # Check for CAPTCHA on initial load
+    if check_for_captcha(driver):
+        captcha_solved, _ = wait_for_captcha_solution(
+            driver, 1)  # Start at page 1
+        if not captcha_solved:
+            logger.error("Initial CAPTCHA not solved. Exiting.")
+            return False
+
+    # Perform initial search
     try:
-        # Navigate to initial URL
-        driver.get("https://emsal.uyap.gov.tr/#")
-        time.sleep(PAGE_WAIT_TIME * 2)  # Give extra time for initial load
+        search_box = wait.until(
+            EC.presence_of_element_located(SEARCH_BOX))
+        search_box.send_keys("Hukuk" + Keys.RETURN)
+        wait_for_element(driver, RESULT_ROWS)
+    except Exception as e:
+        logger.error(f"Failed to perform initial search: {e}")
+        return False
 
-        # Check for CAPTCHA on initial load
-        if check_for_captcha(driver):
-            captcha_solved, _ = wait_for_captcha_solution(
-                driver, 1)  # Start at page 1
-            if not captcha_solved:
-                logger.error("Initial CAPTCHA not solved. Exiting.")
-                driver.quit()
-                return
+    # Navigate to the starting page if needed
+    if current_page > 1:
+        logger.info(f"Navigating to starting page {current_page}")
+        if not navigate_to_page(driver, current_page):
+            logger.error(
+                f"Failed to navigate to starting page {current_page}. Exiting.")
+            return False
 
-        # Perform initial search
-        try:
-            search_box = wait.until(
-                EC.presence_of_element_located((By.TAG_NAME, "input")))
-            search_box.send_keys("Hukuk" + Keys.RETURN)
-            time.sleep(PAGE_WAIT_TIME * 2)  # Wait longer for search results
-        except Exception as e:
-            logger.error(f"Failed to perform initial search: {e}")
-            driver.quit()
-            return
+    return True
 
-        # Navigate to the starting page if needed
-        if current_page > 1:
-            logger.info(f"Navigating to starting page {current_page}")
-            if not navigate_to_page(driver, current_page):
-                logger.error(
-                    f"Failed to navigate to starting page {current_page}. Exiting.")
-                driver.quit()
-                return
 
-        batch_data = []
+def crawl(driver, wait, current_page, write_queue):
+    """Scrape from current_page until the end, a stop request or a failure.
 
-        while not terminate:
-            logger.info(f"Processing page {current_page}")
+    Returns the page it stopped on so a restarted browser can pick up there.
+    """
+    try:
+        total_pages = get_total_pages(driver)
+        logger.info(f"Search returned {total_pages or 'an unknown number of'} pages")
+
+        while not terminate.is_set():
+            logger.info(f"Processing page {current_page}/{total_pages or '?'}")
 
             # Process current page and get updated current_page if it changed due to CAPTCHA
             page_cases, updated_page = process_page(driver, wait, current_page)
@@ -543,48 +790,42 @@ def main():
 
                     # Try moving to next page
                     try:
-                        next_button = driver.find_element(
-                            By.ID, "detayAramaSonuclar_next")
-                        if "disabled" in next_button.get_attribute("class"):
+                        if not click_next_page(driver):
                             logger.info("No more pages available")
-                            terminate = True
                             break
 
-                        next_button.click()
-                        time.sleep(PAGE_WAIT_TIME)
                         current_page += 1
                         logger.info(f"Moved to next page: {current_page}")
                         continue
                     except Exception as e:
                         logger.error(
                             f"Failed to navigate to next page after empty results: {e}")
-                        terminate = True
                         break
             else:
                 logger.info(
                     f"Successfully processed {len(page_cases)} cases on page {current_page}")
-                batch_data.extend(page_cases)
-
-            # Save batch
-            if len(batch_data) >= BATCH_SIZE * 10 or terminate:  # 10 cases per page * BATCH_SIZE
-                logger.info(f"Saving batch of {len(batch_data)} cases")
-                save_to_csv(batch_data)
-                batch_data = []
+                # Save every page as soon as it is scraped so a crash loses
+                # at most the page in progress
+                write_queue.put([case.as_dict() for case in page_cases])
 
             # Check if we should terminate
-            if terminate:
+            if terminate.is_set():
                 break
 
+            # Stop at the known last page instead of probing Next; re-read the
+            # count first since new decisions can add pages during a long run
+            if total_pages and current_page >= total_pages:
+                total_pages = get_total_pages(driver) or total_pages
+                if current_page >= total_pages:
+                    logger.info(f"Reached last page {total_pages}")
+                    break
+
             # Navigate to next page
             try:
-                next_button = driver.find_element(
-                    By.ID, "detayAramaSonuclar_next")
-                if "disabled" in next_button.get_attribute("class"):
+                if not click_next_page(driver):
                     logger.info("No more pages available")
                     break
 
-                next_button.click()
-                time.sleep(PAGE_WAIT_TIME)
                 current_page += 1
                 logger.info(f"Navigated to page {current_page}")
             except NoSuchElementException:
@@ -623,13 +864,83 @@ def main():
 
     except Exception as e:
         logger.error(f"Critical error: {e}")
-    finally:
-        # Save remaining data
-        if batch_data:
-            logger.info(f"Saving final batch of {len(batch_data)} cases")
-            save_to_csv(batch_data)
+    return current_page
+
+
+def driver_alive(driver):
+    """Check whether the browser session still answers commands"""
+    try:
+        driver.current_url
+        return True
+    except WebDriverException:
+        return False
+
 
+def quit_driver(driver):
+    """Close the browser, ignoring errors from a session that already died"""
+    try:
         driver.quit()
+    except Exception as e:
+        logger.warning(f"Error closing browser: {e}")
+
+
+def release_profile_lock():
+    """Remove the lock files a crashed Chrome leaves in the persistent profile"""
+    for name in ("SingletonLock", "SingletonSocket", "SingletonCookie"):
+        path = os.path.join(CHROME_PROFILE_DIR, name)
+        if os.path.lexists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Could not remove stale {path}: {e}")
+
+
+def main():
+    last_page = read_last_page()
+    current_page = last_page + 1 if last_page > 0 else 1
+    logger.info(f"Starting from page {current_page}")
+
+    # Keep one handle open for the whole run instead of reopening per page
+    try:
+        csv_file, writer = open_csv_writer()
+    except ValueError as e:
+        logger.error(str(e))
+        return
+    # Saving runs on its own thread so the browser never waits on the disk
+    write_queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+    writer_thread = threading.Thread(
+        target=csv_writer_loop, args=(write_queue, csv_file, writer), daemon=True)
+    writer_thread.start()
+    driver = None
+    try:
+        for restart in range(MAX_DRIVER_RESTARTS + 1):
+            if restart:
+                logger.error(
+                    f"Browser session lost, restarting Chrome ({restart}/{MAX_DRIVER_RESTARTS}) at page {current_page}")
+                quit_driver(driver)
+                # Otherwise the relaunch refuses the profile as still in use
+                release_profile_lock()
+            driver = build_driver()
+            wait = WebDriverWait(driver, 20)
+
+            try:
+                if start_search(driver, wait, current_page):
+                    current_page = crawl(driver, wait, current_page, write_queue)
+            except WebDriverException as e:
+                logger.error(f"Browser error: {e}")
+
+            # Only a crashed browser is worth restarting; anything else ends the run
+            if terminate.is_set() or driver_alive(driver):
+                break
+    except Exception as e:
+        logger.error(f"Critical error: {e}")
+    finally:
+        # Let the writer drain everything queued before closing the file
+        write_queue.put(None)
+        writer_thread.join()
+        csv_file.close()
+        if driver is not None:
+            quit_driver(driver)
         logger.info("Scraper terminated gracefully")
 
 